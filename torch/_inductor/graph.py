@@ -1,7 +1,7 @@
+import functools
 import hashlib
 import logging
 import operator
-import os
 import re
 import sys
 import time
@@ -39,7 +39,15 @@ from .exc import (
     MissingOperatorWithDecomp,
     MissingOperatorWithoutDecomp,
 )
-from .ir import Constant, FixedLayout, InputBuffer, Pointwise, Reduction, TensorBox
+from .ir import (
+    Constant,
+    FixedLayout,
+    InputBuffer,
+    NHWC_STRIDE_ORDER,
+    Pointwise,
+    Reduction,
+    TensorBox,
+)
 from .lowering import (
     FALLBACK_ALLOW_LIST,
     fallback_handler,
@@ -55,12 +63,84 @@ from .utils import convert_shape_to_inductor, gather_origins, get_sympy_Expr_dty
 from .virtualized import V
 
 log = logging.getLogger(__name__)
+
+_AS_STRIDED_NAME_RE = re.compile(r"(as_strided|reinterpret_tensor)\(([a-zA-Z0-9_]+),")
+
+# whether the backends were compiled in cannot change within a process, so
+# probe torch._C once instead of per lowered node
+_HAS_MKLDNN = bool(torch._C._has_mkldnn)
+_HAS_MKL = bool(torch._C.has_mkl)
+
+# as_strided ops need their input to keep the same size/stride as the eager
+# model to align with eager behavior
+_AS_STRIDED_OPS = frozenset(
+    [
+        torch.ops.aten.as_strided.default,
+        torch.ops.aten.as_strided_.default,
+        torch.ops.aten.as_strided_scatter.default,
+    ]
+)
+
+
+@functools.lru_cache(None)
+def _need_fixed_layout_ops(layout_opt: bool):
+    """
+    Ops whose inputs we force back to their eager stride order.
+
+    This inclusion is somewhat controversial (from discussion between
+    Horace, Natalia, and Elias).  Currently, it's not very clear why this
+    is helpful.  The general idea here is that even though a node may have
+    FlexibleLayout, we still often *treat* it as if it was contiguous.
+    This appears to sometimes result in suboptimal behavior.
+
+    When we do a better job selecting layout, we should revisit this.
+    """
+    ops = {
+        torch.ops.aten.convolution_backward.default,
+        torch.ops.aten.mm.default,
+        torch.ops.aten._int_mm.default,
+    }
+    if not layout_opt:
+        ops.add(torch.ops.aten.convolution.default)
+    # the mkldnn/onednn/mkl namespaces only resolve when the backends are
+    # compiled in, so they must stay behind the probes
+    if _HAS_MKLDNN:
+        ops.update(
+            [
+                torch.ops.mkldnn._convolution_pointwise.default,
+                torch.ops.mkldnn._convolution_pointwise.binary,
+                torch.ops.mkldnn._convolution_pointwise_.binary,
+                torch.ops.mkldnn._convolution_transpose_pointwise.default,
+                torch.ops.mkldnn._linear_pointwise.default,
+                torch.ops.mkldnn._linear_pointwise.binary,
+                torch.ops.aten.mkldnn_rnn_layer.default,
+                torch.ops.onednn.qconv2d_pointwise.default,
+                torch.ops.onednn.qconv2d_pointwise.binary,
+                torch.ops.onednn.qlinear_pointwise.default,
+            ]
+        )
+        if _HAS_MKL:
+            ops.add(torch.ops.mkl._mkl_linear.default)
+    return frozenset(ops)
+
+
+@functools.lru_cache(None)
+def _code_write_pool():
+    from concurrent.futures import ThreadPoolExecutor
+
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix="inductor_code_write")
+
+
+# kind tags for GraphLowering._name_source entries
+_SOURCE_CONSTANT = 0
+_SOURCE_BUFFER = 1
+_SOURCE_INPUT = 2
 perf_hint_log = torch._logging.getArtifactLogger(__name__, "perf_hints")
 output_code_log = torch._logging.getArtifactLogger(__name__, "output_code")
 
 
-def supported_dtype_of_cpp_wrapper(dtype, cuda):
-    supported_dtype = {
+_CPP_WRAPPER_DTYPES = frozenset(
+    {
         torch.float32,
         torch.float64,
         torch.int64,
@@ -73,15 +153,22 @@ def supported_dtype_of_cpp_wrapper(dtype, cuda):
         torch.complex64,
         # torch.float16, # TODO: implement this
     }
-    if cuda:
-        supported_dtype.add(torch.float16)
+)
+_CPP_WRAPPER_DTYPES_CUDA = _CPP_WRAPPER_DTYPES | {torch.float16}
+
+
+def supported_dtype_of_cpp_wrapper(dtype, cuda):
+    return dtype in (_CPP_WRAPPER_DTYPES_CUDA if cuda else _CPP_WRAPPER_DTYPES)
+
 
-    return dtype in supported_dtype
+# hoisted: may_get_constant_buffer_dtype is called in a per-symbol loop and
+# rebuilding the isinstance tuple there is measurable
+_CONSTANT_BUFFER_TYPES = (sympy.Symbol, sympy.Expr, sympy.core.numbers.Integer)
 
 
 def may_get_constant_buffer_dtype(constant_buffer):
     assert isinstance(
-        constant_buffer, (sympy.Symbol, sympy.Expr, sympy.core.numbers.Integer)
+        constant_buffer, _CONSTANT_BUFFER_TYPES
     ), "get_constant_buffer_dtype only supports input of sympy.Symbol, sympy.Expr or sympy.core.numbers.Integer"
     if isinstance(constant_buffer, sympy.core.numbers.Integer):
         return torch.int64
@@ -97,9 +184,30 @@ def may_get_constant_buffer_dtype(constant_buffer):
         return None
 
 
+_MAGIC_OPS = frozenset(method_to_operator(m) for m in magic_methods)
+
+
+@functools.lru_cache(maxsize=4096)
+def _sym_int(i: int) -> sympy.Integer:
+    # sympy.Integer construction is surprisingly expensive and the same
+    # small sizes/strides show up on every weight; cache the wrappers
+    return sympy.Integer(i)
+
+
+def _tensor_content_hash(data: torch.Tensor) -> str:
+    """
+    Hash of a tensor's raw bytes, used to bucket graph constants for
+    deduplication without comparing against every existing constant.
+    """
+    t = data.detach()
+    if t.device.type != "cpu":
+        t = t.cpu()
+    raw = t.contiguous().reshape(-1).view(torch.uint8)
+    return hashlib.blake2b(raw.numpy().tobytes(), digest_size=16).hexdigest()
+
+
 def is_magic_method(op):
-    magic_ops = {method_to_operator(m) for m in magic_methods}
-    return op in magic_ops
+    return op in _MAGIC_OPS
 
 
 class GraphLowering(torch.fx.Interpreter):
@@ -134,16 +242,20 @@ class GraphLowering(torch.fx.Interpreter):
                 source,
             )
 
-        size = [i.node.expr if isinstance(i, torch.SymInt) else i for i in size]
-        stride = [i.node.expr if isinstance(i, torch.SymInt) else i for i in stride]
+        # bind the type locally; resolving torch.SymInt per element adds up
+        # over many-input graphs, and fully static dims pass through as ints
+        # without any re-wrapping
+        SymInt = torch.SymInt
+        size = [i.node.expr if isinstance(i, SymInt) else i for i in size]
+        stride = [i.node.expr if isinstance(i, SymInt) else i for i in stride]
         return size, stride
 
     def static_sizes_strides(self, ex: torch.Tensor):
         """
         Primarily used to weights
         """
-        size = [sympy.Integer(i) for i in ex.size()]
-        stride = [sympy.Integer(i) for i in ex.stride()]
+        size = [_sym_int(i) for i in ex.size()]
+        stride = [_sym_int(i) for i in ex.stride()]
         return size, stride
 
     def init_backend_registration(self):
@@ -190,10 +302,19 @@ class GraphLowering(torch.fx.Interpreter):
         self.graph_outputs: Optional[List[ir.IRNode]] = None
         self.device_types: Set[str] = set()
         self.device_idxs: Set[int] = set()
+        # device types seen on registered buffers, tracked incrementally so
+        # init_wrapper_code doesn't rescan every buffer
+        self.buffer_device_types: Set[str] = set()
         self.cuda = False
         self.buffers: List[ir.ComputedBuffer] = []
         self.constants: OrderedDict[str, torch.Tensor] = OrderedDict()
         self.constant_reprs: Dict[str, str] = {}
+        # (dtype, device, size, stride, content hash) -> names of constants
+        # with that signature; lets add_tensor_constant dedup against a small
+        # bucket instead of every registered constant
+        self._constant_dedup_index: Dict[Tuple[Any, ...], List[str]] = {}
+        # next fresh-name counter per constant name prefix
+        self._constant_prefix_cnt: DefaultDict[str, int] = defaultdict(int)
         self.removed_buffers: Set[str] = set()
         self.removed_inplace_buffers: Set[str] = set()
         self.mutated_buffers: Set[str] = set()
@@ -206,23 +327,41 @@ class GraphLowering(torch.fx.Interpreter):
             Callable[[List[ir.ExternKernelNode]], Any]
         ] = extern_node_serializer
         self.current_node: Optional[torch.fx.Node] = None
+        self._fake_mode = None
         self.num_static_inputs = num_static_inputs
         self.lists: Dict[str, List[str]] = {}
         self.mutated_inputs: Set[str] = set()
         self.mutated_input_idxs: List[int] = []
         self.name_to_buffer: Dict[str, ir.ComputedBuffer] = {}
         self.name_to_users: DefaultDict[str, List[ir.IRNode]] = defaultdict(list)
+        # use-def registrations queued by register_users_of; folded into
+        # name_to_users on demand so the per-node path only appends
+        self._pending_user_registrations: List[Tuple[ir.IRNode, Tuple[str, ...]]] = []
+        # merged view of constants/name_to_buffer/graph_inputs keyed by name,
+        # so get_buffer/get_dtype/get_numel resolve names with one dict lookup
+        self._name_source: Dict[str, Tuple[int, Any]] = {}
         self.creation_time = time.time()
         self.name = "GraphLowering"
         self.cpp_wrapper = cpp_wrapper
         self.aot_mode = aot_mode
         self.graph_id = graph_id
         self.scheduler = None
+        # bumped on buffer registration; lets _get_scheduler reuse a
+        # constructed Scheduler when the buffer list has not changed
+        self._buffers_version = 0
+        self._scheduler_buffers_version = -1
         self.nodes_prefer_channels_last = (
             self.find_nodes_prefer_channels_last() if self.layout_opt else set()
         )
         self._warned_fallback = {"aten.convolution_backward"}
-        self.user_visible_outputs = user_visible_outputs
+        # callers sometimes pass a list of names (e.g. the freezing path);
+        # normalize to a frozenset since run_node does a membership test per
+        # channels-last candidate node
+        self.user_visible_outputs = (
+            user_visible_outputs
+            if isinstance(user_visible_outputs, frozenset)
+            else frozenset(user_visible_outputs)
+        )
         self.cache_key: str = ""  # This is the cache key for the compiled artifact
         self.cache_path: str = ""  # This is the path in the filesystem where the compiled artifact is stored
         self.cache_linemap: List[
@@ -232,7 +371,7 @@ class GraphLowering(torch.fx.Interpreter):
         )  # This is the linemap used by the profiler to mark custom compiled kernels getting run
         # Used if lowering encounters cases where cudagraphs are not supported
         self.disable_cudagraphs = False
-        self.orig_gm: torch.fx.GraphModule = gm.__copy__()
+        self._orig_gm: Optional[torch.fx.GraphModule] = None
         self.init_backend_registration()
 
     @staticmethod
@@ -244,10 +383,27 @@ class GraphLowering(torch.fx.Interpreter):
         if not config.layout_optimization:
             return False
 
-        conv_nodes = [
-            n for n in gm.graph.nodes if n.target == torch.ops.aten.convolution.default
+        # Bucket the nodes by target in a single walk (fx.Graph has no
+        # find_nodes index in this tree) so the ops of interest are found by
+        # dict lookup instead of comparing every node's target against each
+        # one of them.
+        nodes_by_target: DefaultDict[Any, List[torch.fx.Node]] = defaultdict(list)
+        for n in gm.graph.nodes:
+            nodes_by_target[n.target].append(n)
+        # fx.Graph tracks its length; no need to materialize the node list
+        nnode = len(gm.graph.nodes)
+
+        aten = torch.ops.aten
+        conv_metas = [
+            (n.args[0].meta["val"], n.args[1].meta["val"], n.args[-1])
+            for n in nodes_by_target.get(aten.convolution.default, ())
         ]
-        nconv = len(conv_nodes)
+        has_sdpa = (
+            aten._scaled_dot_product_flash_attention.default in nodes_by_target
+            or aten._scaled_dot_product_efficient_attention.default in nodes_by_target
+        )
+
+        nconv = len(conv_metas)
 
         if nconv == 0:
             return False
@@ -257,11 +413,11 @@ class GraphLowering(torch.fx.Interpreter):
             return False
 
         # For cpu backend and mkldnn enabled, we always using channels_last for a better performance.
+        cpu_device = torch.device("cpu")
         if (
             all(
-                n.args[idx].meta["val"].device == torch.device("cpu")
-                for n in conv_nodes
-                for idx in [0, 1]
+                inp.device == cpu_device and weight.device == cpu_device
+                for inp, weight, _ in conv_metas
             )
             and torch.backends.mkldnn.enabled
             and torch.backends.mkldnn.is_available()
@@ -271,18 +427,37 @@ class GraphLowering(torch.fx.Interpreter):
         # Followering models are skipped due to this:
         # jx_nest_base
         # volo_d1_224
-        if len(list(gm.graph.nodes)) >= 300 * nconv:
+        if nnode >= 300 * nconv:
             log.debug("Only a few conv, skip layout optimization")
             return False
 
         if any(
-            free_symbols(n.args[idx].meta["val"]) for n in conv_nodes for idx in [0, 1]
+            free_symbols(inp) or free_symbols(weight) for inp, weight, _ in conv_metas
         ):
             log.debug(
                 "See perf regression with dynamic shape. Follow up in https://github.com/pytorch/pytorch/issues/102670"
             )
             return False
 
+        # The shape-based heuristics below all look at the same weight
+        # metadata, so compute their verdicts in one pass over the convs with
+        # the sizes fetched into locals once per node.
+        has_grouped_conv = False
+        has_small_out_channel = False
+        all_small_channels = True
+        for _, weight, groups in conv_metas:
+            # fetch the shape once; indexing the Size tuple is much cheaper
+            # than a Tensor.size(i) call per dimension
+            shape = weight.shape
+            out_channels = shape[0]
+            in_channels = shape[1]
+            if groups > 1 and in_channels > 1:
+                has_grouped_conv = True
+            if out_channels * 2 <= in_channels and shape[2] > 1:
+                has_small_out_channel = True
+            if out_channels > 64 or in_channels > 64:
+                all_small_channels = False
+
         # Channels last layout can dramatically hurt grouped conv perf. E.g.
         # Conv with arguments like
         #   {"input_shape": [32, 224, 112, 112], "weight_shape": [224, 112, 3, 3],
@@ -300,9 +475,7 @@ class GraphLowering(torch.fx.Interpreter):
         #
         # The following heuristics skip using channels-last if the model contains
         # grouped convolution with in-channels > 1.
-        if any(
-            n.args[-1] > 1 and n.args[1].meta["val"].size(1) > 1 for n in conv_nodes
-        ):
+        if has_grouped_conv:
             log.debug("Found grouped convolution with >1 in_channels!")
             return False
 
@@ -313,11 +486,7 @@ class GraphLowering(torch.fx.Interpreter):
         # - phlippe_densenet (slightly worse)
         # - Background_Matting (1.22x -> 0.821x)
         # - pytorch_CycleGAN_and_pix2pix (1.597x -> 1.294x)
-        if any(
-            n.args[1].meta["val"].size(0) * 2 <= n.args[1].meta["val"].size(1)
-            and n.args[1].meta["val"].size(2) > 1
-            for n in conv_nodes
-        ):
+        if has_small_out_channel:
             log.debug(
                 "Skip layout optimization because some convolutions have smaller out_channel"
             )
@@ -325,10 +494,7 @@ class GraphLowering(torch.fx.Interpreter):
 
         # Following models are skipped due to this:
         # - functorch_maml_omniglot
-        if all(
-            n.args[1].meta["val"].size(0) <= 64 and n.args[1].meta["val"].size(1) <= 64
-            for n in conv_nodes
-        ):
+        if all_small_channels:
             log.debug("Skip layout opt because all convolution channels are too small")
             return False
 
@@ -346,15 +512,11 @@ class GraphLowering(torch.fx.Interpreter):
         # inputs have the layout needed. But that seems to have worse perf than disabing the layout opt.
         # TODO(shunting) revisit if we can still apply layout optimization to models containing sdpa while
         # bringing perf gains.
-        for n in gm.graph.nodes:
-            if n.target in (
-                torch.ops.aten._scaled_dot_product_flash_attention.default,
-                torch.ops.aten._scaled_dot_product_efficient_attention.default,
-            ):
-                log.debug(
-                    "Skip layout optimization because sdpa (scaled dot product attention) is found"
-                )
-                return False
+        if has_sdpa:
+            log.debug(
+                "Skip layout optimization because sdpa (scaled dot product attention) is found"
+            )
+            return False
 
         return True
 
@@ -377,15 +539,25 @@ class GraphLowering(torch.fx.Interpreter):
         With rule 2, we makes sure all the tensors in the chain uses channels last layout. So both copies
         can be saved.
         """
-        output_set = set()
-        for n in reversed(self.module.graph.nodes):
-            if n.target == torch.ops.aten.convolution.default:
-                output_set.add(n)
+        # Track membership with a bytearray indexed by topological position
+        # rather than a set: the two passes below do a membership test per
+        # user edge, and indexing a flat flag array is much cheaper than
+        # hashing fx nodes.
+        nodes = list(self.module.graph.nodes)
+        node_pos = {n: i for i, n in enumerate(nodes)}
+        marked = bytearray(len(nodes))
+        # bind the overload outside the loop; the torch.ops attribute chain
+        # costs three lookups per access
+        conv_target = torch.ops.aten.convolution.default
+        for i in range(len(nodes) - 1, -1, -1):
+            n = nodes[i]
+            if n.target == conv_target:
+                marked[i] = 1
                 continue
 
             for user in n.users:
-                if user in output_set:
-                    output_set.add(n)
+                if marked[node_pos[user]]:
+                    marked[i] = 1
                     break
 
         # need a second pass to add downstream nodes of those channel last nodes to the sets.
@@ -402,12 +574,22 @@ class GraphLowering(torch.fx.Interpreter):
         # - res2net101_26w_4s
         # - res2net50_14w_8s
         # - sebotnet33ts_256
-        for n in self.module.graph.nodes:
-            if n in output_set:
+        for i, n in enumerate(nodes):
+            if marked[i]:
                 for child in n.users:
-                    output_set.add(child)
+                    marked[node_pos[child]] = 1
+
+        return {n for i, n in enumerate(nodes) if marked[i]}
 
-        return output_set
+    @property
+    def orig_gm(self) -> torch.fx.GraphModule:
+        # Copying a GraphModule relinks every node, which is expensive for
+        # large models, and the snapshot is only consumed by debug tooling.
+        # Build it on first access instead of in __init__; lowering does not
+        # mutate self.module's graph, so the late copy is equivalent.
+        if self._orig_gm is None:
+            self._orig_gm = self.module.__copy__()
+        return self._orig_gm
 
     def warn_fallback(self, name):
         if name not in self._warned_fallback:
@@ -420,49 +602,71 @@ class GraphLowering(torch.fx.Interpreter):
 
     @property
     def fake_mode(self):
+        # cached by run(); fall back to the virtualized lookup when accessed
+        # outside a graph run
+        if self._fake_mode is not None:
+            return self._fake_mode
         return V.fake_mode
 
+    def _record_name_source(self, name: str, kind: int, value):
+        # constants shadow buffers which shadow graph inputs, matching the
+        # lookup order the getters below used to implement with chained dicts
+        prev = self._name_source.get(name)
+        if prev is None or kind < prev[0]:
+            self._name_source[name] = (kind, value)
+
     def get_buffer(self, buffer_name: str):
-        if buffer_name in self.name_to_buffer:
-            return self.name_to_buffer[buffer_name]
-        if buffer_name in self.graph_inputs:
-            return self.graph_inputs[buffer_name]
+        entry = self._name_source.get(buffer_name)
+        if entry is not None and entry[0] != _SOURCE_CONSTANT:
+            return entry[1]
         return None
 
     def get_dtype(self, buffer_name: str):
-        if buffer_name in self.constants:
-            return self.constants[buffer_name].dtype
-        if buffer_name in self.name_to_buffer:
-            return self.name_to_buffer[buffer_name].get_dtype()
-        if buffer_name in self.graph_inputs:
-            return self.graph_inputs[buffer_name].get_dtype()
-        m = re.match(r"(as_strided|reinterpret_tensor)\(([a-zA-Z0-9_]+),", buffer_name)
-        if m:
-            return self.get_dtype(m.group(1))
+        entry = self._name_source.get(buffer_name)
+        if entry is not None:
+            kind, value = entry
+            if kind == _SOURCE_CONSTANT:
+                return value.dtype
+            return value.get_dtype()
+        # only as_strided(...)/reinterpret_tensor(...) names can match below;
+        # skip the regex for everything else
+        if buffer_name[:1] in ("a", "r"):
+            m = _AS_STRIDED_NAME_RE.match(buffer_name)
+            if m:
+                return self.get_dtype(m.group(1))
         raise KeyError(f"could not find {buffer_name}")
 
     def get_numel(self, buffer_name: str):
         from .ir import MultiOutputLayout
 
-        if buffer_name in self.constants:
-            return self.constants[buffer_name].numel()
-        if buffer_name in self.name_to_buffer:
-            buf = self.name_to_buffer[buffer_name]
-            if isinstance(getattr(buf, "layout", None), MultiOutputLayout):
+        entry = self._name_source.get(buffer_name)
+        if entry is not None:
+            kind, value = entry
+            if kind == _SOURCE_CONSTANT:
+                return value.numel()
+            if kind == _SOURCE_BUFFER and isinstance(
+                getattr(value, "layout", None), MultiOutputLayout
+            ):
                 return 1
-            return buf.get_numel()
-        if buffer_name in self.graph_inputs:
-            return self.graph_inputs[buffer_name].get_numel()
+            return value.get_numel()
         raise KeyError(f"could not find {buffer_name}")
 
     @dynamo_timed
     def run(self, *args):
+        # fake_mode is stable for the duration of the run; cache it so the
+        # property doesn't go through V on every access in the hot loop
+        self._fake_mode = V.fake_mode
         return super().run(*args)
 
     def register_buffer(self, buffer: ir.ComputedBuffer):
         name = f"buf{len(self.buffers)}"
         self.buffers.append(buffer)
+        self._buffers_version += 1
         self.name_to_buffer[name] = buffer
+        self._record_name_source(name, _SOURCE_BUFFER, buffer)
+        device = buffer.get_device()
+        if device is not None:
+            self.buffer_device_types.add(device.type)
         return name
 
     def register_list(self, buffer_names: List[str]):
@@ -471,25 +675,33 @@ class GraphLowering(torch.fx.Interpreter):
         return name
 
     def register_users_of(self, node_output):
-        def register(value):
+        # Read names are captured here (realization can change them later),
+        # but the dict updates are queued and applied in one batch the next
+        # time name_to_users is consulted; see _flush_pending_user_registrations.
+        pending = self._pending_user_registrations
+        stack = [node_output]
+        while stack:
+            value = stack.pop()
             if isinstance(value, (list, tuple)):
-                for x in value:
-                    register(x)
+                stack.extend(value)
             if isinstance(value, ir.IRNode):
-                if (
-                    not hasattr(value, "data")
-                    or not isinstance(value.data, ir.IRNode)
-                    or not (
-                        hasattr(value.data, "data")
-                        and isinstance(value.data.data, ir.IRNode)
-                    )
-                ):
-                    return
-
-                for read_name in value.get_read_names():
-                    self.name_to_users[read_name].append(value)
-
-        register(node_output)
+                # getattr with a default instead of hasattr/attribute chains:
+                # the raised-and-swallowed AttributeErrors are costly in this
+                # per-node loop
+                data = getattr(value, "data", None)
+                if not isinstance(data, ir.IRNode):
+                    continue
+                if not isinstance(getattr(data, "data", None), ir.IRNode):
+                    continue
+
+                pending.append((value, tuple(value.get_read_names())))
+
+    def _flush_pending_user_registrations(self):
+        name_to_users = self.name_to_users
+        for value, read_names in self._pending_user_registrations:
+            for read_name in read_names:
+                name_to_users[read_name].append(value)
+        self._pending_user_registrations.clear()
 
     def mark_buffer_mutated(self, name: str):
         """
@@ -498,6 +710,7 @@ class GraphLowering(torch.fx.Interpreter):
         """
         assert isinstance(name, str)
         self.mutated_buffers.add(name)
+        self._flush_pending_user_registrations()
 
         if name not in self.name_to_users:
             return
@@ -505,18 +718,40 @@ class GraphLowering(torch.fx.Interpreter):
         for user in self.name_to_users[name]:
             user.realize()
 
+    @staticmethod
+    def _constant_dedup_key(data: torch.Tensor, content_hash: str):
+        return (
+            data.dtype,
+            data.device,
+            tuple(data.size()),
+            tuple(data.stride()),
+            content_hash,
+        )
+
     def add_tensor_constant(self, data, name=None):
         def allocate(name):
-            for constant_name, value in self.constants.items():
-                if (
-                    not data.is_mkldnn
-                    and data.size() == value.size()
-                    and data.stride() == value.stride()
-                    and data.dtype == value.dtype
-                    and data.device == value.device
-                    and torch.eq(data, value).all()
-                ):
-                    return constant_name
+            bucket = None
+            content_hash = None
+            if not data.is_mkldnn:
+                content_hash = _tensor_content_hash(data)
+                bucket = self._constant_dedup_index.setdefault(
+                    self._constant_dedup_key(data, content_hash), []
+                )
+                for constant_name in bucket:
+                    value = self.constants[constant_name]
+                    # duplicate constants are usually literal aliases of the
+                    # same parameter; the bucket key already matched dtype/
+                    # size/stride, so identical storage means identical data
+                    # without running an elementwise kernel
+                    if (
+                        data.untyped_storage().data_ptr()
+                        == value.untyped_storage().data_ptr()
+                        and data.storage_offset() == value.storage_offset()
+                    ):
+                        return constant_name
+                    # guard against hash collisions with a full comparison
+                    if torch.eq(data, value).all():
+                        return constant_name
 
             if name is None:
                 name = f"constant{len(self.constants)}"
@@ -525,15 +760,27 @@ class GraphLowering(torch.fx.Interpreter):
             # We may generate a var name for each constant in the codegen.
             # Let's only keep sane characters.
             prefix = re.sub(r"[^a-zA-Z0-9_]", "_", name)
-            name = prefix
-            cnt = 0
+            # start probing from the last counter handed out for this prefix
+            # so allocation stays amortized O(1) when many constants share a
+            # prefix; the loop still defends against names colliding across
+            # prefixes
+            cnt = self._constant_prefix_cnt[prefix]
+            name = prefix if cnt == 0 else f"{prefix}_{cnt - 1}"
             while name in self.constants:
                 name = f"{prefix}_{cnt}"
                 cnt += 1
+            self._constant_prefix_cnt[prefix] = cnt + 1
             self.constants[name] = data
-            self.constant_reprs[name] = hashlib.sha256(
-                repr(data).encode("utf-8")
-            ).hexdigest()
+            self._record_name_source(name, _SOURCE_CONSTANT, data)
+            if bucket is not None:
+                bucket.append(name)
+            if content_hash is None:
+                # mkldnn tensors cannot be viewed as raw bytes; fall back to
+                # hashing the repr for those
+                content_hash = hashlib.blake2b(
+                    repr(data).encode("utf-8"), digest_size=16
+                ).hexdigest()
+            self.constant_reprs[name] = content_hash
             return name
 
         name = allocate(name)
@@ -555,7 +802,13 @@ class GraphLowering(torch.fx.Interpreter):
             return name
         alt_name = f"{name}_{device_override.type}{device_override.index or 0}"
         if alt_name not in self.constants:
-            self.constants[alt_name] = self.constants[name].to(device_override)
+            copied = self.constants[name].to(device_override)
+            self.constants[alt_name] = copied
+            self._record_name_source(alt_name, _SOURCE_CONSTANT, copied)
+            if not copied.is_mkldnn:
+                self._constant_dedup_index.setdefault(
+                    self._constant_dedup_key(copied, _tensor_content_hash(copied)), []
+                ).append(alt_name)
         return alt_name
 
     def placeholder(self, target: str, args, kwargs):
@@ -563,12 +816,17 @@ class GraphLowering(torch.fx.Interpreter):
         if isinstance(example, SymTypes):
             expr = example.node.expr
             self.graph_inputs[target] = expr
+            self._record_name_source(target, _SOURCE_INPUT, expr)
             return expr
         elif isinstance(example, (int, bool, float)):
             expr = sympy.sympify(example)
             self.graph_inputs[target] = expr
+            self._record_name_source(target, _SOURCE_INPUT, expr)
             return expr
         assert isinstance(example, torch.Tensor), example
+        # Tensor.device constructs a fresh torch.device on every access;
+        # fetch it once for the uses below
+        device = example.device
         # todo(chilli): We can remove the last check once we turn buffers into
         # static shape tensors. That's a hack to workaround Inductor believing
         # the buffer should be static but us passing in a fake tensor with
@@ -582,13 +840,14 @@ class GraphLowering(torch.fx.Interpreter):
         tensor = TensorBox.create(
             InputBuffer(
                 target,
-                FixedLayout(example.device, example.dtype, sizes, strides),
+                FixedLayout(device, example.dtype, sizes, strides),
             )
         )
         self.graph_inputs[target] = tensor
+        self._record_name_source(target, _SOURCE_INPUT, tensor)
         self.graph_inputs_original[target] = tensor.data.data
-        self.device_types.add(example.device.type)
-        self.add_device_idx(example.device.index)
+        self.device_types.add(device.type)
+        self.add_device_idx(device.index)
         return tensor
 
     def call_function(self, target, args, kwargs):
@@ -683,6 +942,11 @@ class GraphLowering(torch.fx.Interpreter):
             for x in result
         ), result
         self.graph_outputs = [ir.ExternKernel.realize_input(x) for x in result]
+        # position of each output box, so the mutated-input rewrite below does
+        # not do a linear graph_outputs.index search per input
+        output_pos: Dict[int, int] = {}
+        for i, x in enumerate(self.graph_outputs):
+            output_pos.setdefault(id(x), i)
         value: ir.IRNode
         for name, value in self.graph_inputs.items():
             assert isinstance(
@@ -700,11 +964,9 @@ class GraphLowering(torch.fx.Interpreter):
                 # one of our inputs was mutated, need to turn that into a copy
                 ir.MutationLayout.realize_into(value, self.graph_inputs_original[name])
                 # replace output with mutated input
-                try:
-                    ind = self.graph_outputs.index(value_storage_box)
+                ind = output_pos.get(id(value_storage_box))
+                if ind is not None:
                     self.graph_outputs[ind] = self.graph_inputs_original[name]
-                except ValueError:
-                    pass
 
         self.finalize()
         log.debug(
@@ -766,87 +1028,95 @@ class GraphLowering(torch.fx.Interpreter):
             # output different strides than eager
             # long term the solution is to make view() always succeed
             # with infallible strides.
-            # 2: as_strided ops, we need make sure its input has same size/stride with
-            # eager model to align with eager behavior.
-            as_strided_ops = [
-                torch.ops.aten.as_strided.default,
-                torch.ops.aten.as_strided_.default,
-                torch.ops.aten.as_strided_scatter.default,
-            ]
-            is_output = any(user.op == "output" for user in n.users)
-            is_input_for_as_strided = any(
-                user.target in as_strided_ops for user in n.users
-            )
-            if (is_output or is_input_for_as_strided) and isinstance(
-                n.meta["val"], torch.Tensor
-            ):
-                strides = n.meta["val"].stride()
-                dense = torch._prims_common.is_non_overlapping_and_dense(n.meta["val"])
-                # requiring a stride order for a non-dense output wouldn't
-                # recreate the same strides, and would fail with view, defer for now.
-                if dense and len(strides):
-                    stride_order = ir.get_stride_order(strides)
-                    if (
-                        len(result.get_size()) == 4
-                        and n in self.nodes_prefer_channels_last
-                        and n.name not in self.user_visible_outputs
-                        and not is_input_for_as_strided
-                    ):
-                        stride_order = ir.NHWC_STRIDE_ORDER
-                    result = ir.ExternKernel.require_stride_order(result, stride_order)
+            # 2: as_strided ops (_AS_STRIDED_OPS), we need make sure its input
+            # has same size/stride with eager model to align with eager
+            # behavior.
+            # fetch the example value and its strides once; both branches
+            # below would otherwise redo the meta lookup, stride fetch and
+            # stride-order computation for the same node
+            val = n.meta.get("val")
+            val_strides = None
+            val_stride_order = None
+            user_info = None
+            if isinstance(val, torch.Tensor):
+                val_strides = val.stride()
+                # walk n.users exactly once: collect the (op, target) pairs
+                # the realize loop below needs while computing the output/
+                # as_strided flags, instead of traversing the users dict three
+                # times. Non-tensor nodes (symints, lists) never need a stride
+                # order, so they skip the walk entirely.
+                is_output = False
+                is_input_for_as_strided = False
+                user_info = []
+                for user in n.users:
+                    user_op = user.op
+                    user_target = user.target
+                    user_info.append((user_op, user_target))
+                    if user_op == "output":
+                        is_output = True
+                    elif user_target in _AS_STRIDED_OPS:
+                        is_input_for_as_strided = True
+                if is_output or is_input_for_as_strided:
+                    dense = torch._prims_common.is_non_overlapping_and_dense(val)
+                    # requiring a stride order for a non-dense output wouldn't
+                    # recreate the same strides, and would fail with view, defer for now.
+                    if dense and len(val_strides):
+                        val_stride_order = ir.get_stride_order(val_strides)
+                        stride_order = val_stride_order
+                        if (
+                            len(result.get_size()) == 4
+                            and n in self.nodes_prefer_channels_last
+                            and n.name not in self.user_visible_outputs
+                            and not is_input_for_as_strided
+                        ):
+                            stride_order = NHWC_STRIDE_ORDER
+                        result = ir.ExternKernel.require_stride_order(
+                            result, stride_order
+                        )
 
             # Realize if (1) any user need inputs realized, or (2) there is
             # already too many reads and rematerializing can be bad.
-            num_users = len(set(n.users))
-            if num_users > 1 and isinstance(result, TensorBox):
-                for user in n.users:
-                    if user.target in needs_realized_inputs:
+            # Node.users is a dict keyed by the user nodes, so its keys are
+            # already unique; no need to build a set to count them
+            num_users = len(n.users)
+            already_realized = False
+            # type-is checks before isinstance: TensorBox/StorageBox are
+            # effectively final, so the exact-type test hits nearly always
+            # and skips the MRO walk; isinstance stays as the fallback for
+            # hypothetical subclasses
+            if num_users > 1 and (
+                type(result) is TensorBox or isinstance(result, TensorBox)
+            ):
+                # memoized frozenset; see _need_fixed_layout_ops for why these
+                # ops pin their inputs to the eager stride order
+                need_fixed_layout = _need_fixed_layout_ops(self.layout_opt)
+                if user_info is None:
+                    user_info = [(user.op, user.target) for user in n.users]
+                for user_op, user_target in user_info:
+                    if user_target in needs_realized_inputs:
                         result.realize_hint()
-                        # This inclusion is somewhat controversial (from
-                        # discussion between Horace, Natalia, and Elias).
-                        # Currently, it's not very clear why this is helpful.
-                        # The general idea here is that even though a node may
-                        # have FlexibleLayout, we still often *treat* it as if
-                        # it was contiguous. This appears to sometimes result in
-                        # suboptimal behavior.
-                        #
-                        # When we do a better job selecting layout, we should
-                        # revisit this.
-                        need_fixed_layout = [
-                            torch.ops.aten.convolution_backward.default,
-                            torch.ops.aten.mm.default,
-                            torch.ops.aten._int_mm.default,
-                        ]
-                        if not self.layout_opt:
-                            need_fixed_layout.append(torch.ops.aten.convolution.default)
-                        if torch._C._has_mkldnn:
-                            need_fixed_layout += [
-                                torch.ops.mkldnn._convolution_pointwise.default,
-                                torch.ops.mkldnn._convolution_pointwise.binary,
-                                torch.ops.mkldnn._convolution_pointwise_.binary,
-                                torch.ops.mkldnn._convolution_transpose_pointwise.default,
-                                torch.ops.mkldnn._linear_pointwise.default,
-                                torch.ops.mkldnn._linear_pointwise.binary,
-                                torch.ops.aten.mkldnn_rnn_layer.default,
-                                torch.ops.onednn.qconv2d_pointwise.default,
-                                torch.ops.onednn.qconv2d_pointwise.binary,
-                                torch.ops.onednn.qlinear_pointwise.default,
-                            ]
-                            if torch._C.has_mkl:
-                                need_fixed_layout += [torch.ops.mkl._mkl_linear.default]
-                        if user.target in need_fixed_layout:
+                        already_realized = True
+                        if user_target in need_fixed_layout:
+                            if val_stride_order is None:
+                                val_stride_order = ir.get_stride_order(val_strides)
                             result = ir.ExternKernel.require_stride_order(
-                                result, ir.get_stride_order(n.meta["val"].stride())
+                                result, val_stride_order
                             )
-                    if user.op == "output":
+                    if user_op == "output":
                         if isinstance(result.data.data, (Pointwise, Reduction)):
                             result.realize()
+                            already_realized = True
 
                 # TODO(jansel): introduce a store vs inline choice
-                result.mark_reuse(len(n.users))
+                result.mark_reuse(num_users)
 
-            # Realize if the IRNode already has accumulated lots of reads
-            if isinstance(result, TensorBox) and result.has_exceeded_max_reads():
+            # Realize if the IRNode already has accumulated lots of reads;
+            # skip the read-set traversal when this node was just realized
+            if (
+                not already_realized
+                and (type(result) is TensorBox or isinstance(result, TensorBox))
+                and result.has_exceeded_max_reads()
+            ):
                 # Prevent excessive accumulation in a computed buffer, when
                 # there are multiple branches each with small number of memory
                 # reads, but they converge to a user.
@@ -860,22 +1130,34 @@ class GraphLowering(torch.fx.Interpreter):
         # Note: we can't YOLO tree_map over this result, because if there are
         # buffers or a view involved, we might not be able to validly assign
         # the origin_node here.
-        if isinstance(result, TensorBox) and isinstance(result.data, ir.StorageBox):
-            if isinstance(result.data.data, ir.Loops):
-                result.data.data.origin_node = n
-            elif isinstance(result.data.data, ir.Buffer):
-                result.data.data.origin_node = n
-                if isinstance(result.data.data, ir.ComputedBuffer) and isinstance(
-                    result.data.data.data, ir.Loops
+        # Origin tags are only ever consulted by traversals arriving from a
+        # user, so dead nodes kept for side effects can skip the ladder.
+        if (
+            n.users
+            and (type(result) is TensorBox or isinstance(result, TensorBox))
+            and (
+                type(result.data) is ir.StorageBox
+                or isinstance(result.data, ir.StorageBox)
+            )
+        ):
+            # bind the box contents to locals; every dotted access below would
+            # otherwise re-walk the TensorBox -> StorageBox chain
+            storage_data = result.data.data
+            if isinstance(storage_data, ir.Loops):
+                storage_data.origin_node = n
+            elif isinstance(storage_data, ir.Buffer):
+                storage_data.origin_node = n
+                if isinstance(storage_data, ir.ComputedBuffer) and isinstance(
+                    storage_data.data, ir.Loops
                 ):
-                    result.data.data.data.origin_node = n
+                    storage_data.data.origin_node = n
                 # Not really multi-output, can straightforwardly recurse in
                 elif (
-                    isinstance(result.data.data, ir.MultiOutput)
-                    and not result.data.data.indices
+                    isinstance(storage_data, ir.MultiOutput)
+                    and not storage_data.indices
                 ):
-                    if isinstance(result.data.data.inputs[0], ir.Buffer):
-                        result.data.data.inputs[0].origin_node = n
+                    if isinstance(storage_data.inputs[0], ir.Buffer):
+                        storage_data.inputs[0].origin_node = n
 
         self.register_users_of(result)
 
@@ -888,16 +1170,17 @@ class GraphLowering(torch.fx.Interpreter):
         if sys.platform != "linux":
             raise CppWrapperCodeGenError(f"Unsupported platform {sys.platform}")
 
+        # pick the supported set once for the whole signature instead of
+        # re-dispatching through supported_dtype_of_cpp_wrapper per input
+        supported = _CPP_WRAPPER_DTYPES_CUDA if self.cuda else _CPP_WRAPPER_DTYPES
         for value in self.graph_inputs.values():
             dtype = None
             if isinstance(value, TensorBox):
                 dtype = value.get_dtype()
-            elif isinstance(
-                value, (sympy.Symbol, sympy.Expr, sympy.core.numbers.Integer)
-            ):
+            elif isinstance(value, _CONSTANT_BUFFER_TYPES):
                 dtype = may_get_constant_buffer_dtype(value)
 
-            if not supported_dtype_of_cpp_wrapper(dtype, self.cuda):
+            if dtype not in supported:
                 raise CppWrapperCodeGenError(f"Unsupported input dtype {dtype}")
 
     def init_wrapper_code(self):
@@ -909,11 +1192,10 @@ class GraphLowering(torch.fx.Interpreter):
             )
             return
 
-        device_types = self.device_types.copy()
         # In terms of some operations that don't have input tensors, we need to
-        # check the device of the buffers.
-        for buffer in self.buffers:
-            device_types.add(buffer.get_device().type)
+        # check the device of the buffers; register_buffer keeps that set up
+        # to date so no scan over self.buffers is needed here.
+        device_types = self.device_types | self.buffer_device_types
         device_types.discard("cpu")
         # TODO(Eikan): Only support mixing cpu and other device now.
         assert len(device_types) <= 1, "Does not support mixing {}".format(
@@ -925,31 +1207,51 @@ class GraphLowering(torch.fx.Interpreter):
         assert wrapper_code_gen_cls is not None, f"Device {device_type} not supported"
         self.wrapper_code = wrapper_code_gen_cls()
 
-    def codegen(self):
+    def _get_scheduler(self):
+        """
+        Scheduler construction runs the full fusion/ordering analysis; share
+        one instance between codegen and count_bytes as long as the buffer
+        list has not changed since it was built.
+        """
         from .scheduler import Scheduler
 
+        if (
+            self.scheduler is None
+            or self._scheduler_buffers_version != self._buffers_version
+        ):
+            self.scheduler = Scheduler(self.buffers)
+            self._scheduler_buffers_version = self._buffers_version
+        return self.scheduler
+
+    def codegen(self):
+        self._flush_pending_user_registrations()
         self.init_wrapper_code()
 
-        self.scheduler = Scheduler(self.buffers)
+        self.scheduler = self._get_scheduler()
         assert self.scheduler is not None  # mypy can't figure this out
-        V.debug.draw_orig_fx_graph(self.orig_gm, self.scheduler.nodes)
+        # check the flags here so accessing orig_gm (which snapshots the
+        # graph module lazily) is not forced when tracing is off
+        if config.trace.enabled and config.trace.draw_orig_fx_graph:
+            V.debug.draw_orig_fx_graph(self.orig_gm, self.scheduler.nodes)
         self.scheduler.codegen()
         assert self.wrapper_code is not None
         return self.wrapper_code.generate()
 
     def count_bytes(self):
-        from .scheduler import Scheduler
-
-        scheduler = Scheduler(self.buffers)
+        scheduler = self._get_scheduler()
 
         total_bytes = 0
         node_counts = []
         node_runtimes = []
+        # bind the append methods outside the loop; this runs once per
+        # scheduler node and the repeated attribute lookups are pure overhead
+        append_count = node_counts.append
+        append_runtime = node_runtimes.append
         for node in scheduler.nodes:
             num_bytes = node.get_read_write_buffers_sizes()
             total_bytes += num_bytes
-            node_counts.append((node, num_bytes // 4))
-            node_runtimes.append((node, node.get_estimated_runtime()))
+            append_count((node, num_bytes // 4))
+            append_runtime((node, node.get_estimated_runtime()))
         return total_bytes, node_counts, node_runtimes
 
     @dynamo_timed
@@ -957,8 +1259,17 @@ class GraphLowering(torch.fx.Interpreter):
         from .codecache import PyCodeCache
 
         code, linemap = self.codegen()
+
+        # the cache write is disk I/O plus hashing; when parallel compile is
+        # allowed, overlap it with the linemap post-processing below
+        write_future = None
+        if config.compile_threads > 1:
+            write_future = _code_write_pool().submit(PyCodeCache.write, code)
         linemap = [(line_no, node.stack_trace) for line_no, node in linemap]
-        key, path = PyCodeCache.write(code)
+        if write_future is not None:
+            key, path = write_future.result()
+        else:
+            key, path = PyCodeCache.write(code)
         mod = PyCodeCache.load_by_key_path(
             key, path, linemap=linemap, attrs=self.constants
         )
@@ -969,13 +1280,16 @@ class GraphLowering(torch.fx.Interpreter):
         # Logged twice as per https://github.com/pytorch/pytorch/pull/99038#discussion_r1167826029
         # TODO. Revisit this once the logging API is more mature
         assert mod.__file__ is not None
+        assert mod.__file__.endswith(".py")
         log.debug("Output code written to: %s", mod.__file__)
         output_code_log.debug("Output code: \n%s", code)
         output_code_log.info("Output code written to: %s", mod.__file__)
         if config.benchmark_kernel:
             print(f"Compiled module path: {mod.__file__}", file=sys.stderr)
         V.debug.output_code(mod.__file__)
-        V.debug.copy(os.path.splitext(mod.__file__)[0] + ".debug")
+        # PyCodeCache files always end in .py (asserted above), so a plain
+        # slice replaces the os.path.splitext round trip
+        V.debug.copy(mod.__file__[:-3] + ".debug")
         return mod
 
     def compile_to_fn(self):